@@ -1,24 +1,57 @@
 #!/usr/bin/env python3
+import mmap
+import os
 import re
+import shutil
 
-# Read the project file
-with open('class-notes-frontend.xcodeproj/project.pbxproj', 'r') as f:
-    content = f.read()
+PROJECT_PATH = 'class-notes-frontend.xcodeproj/project.pbxproj'
 
-# Remove the proto file from build sources if it exists
-lines = content.split('\n')
-filtered_lines = []
-for line in lines:
-    # Skip lines that reference subscription.proto in build sources
-    if 'subscription.proto' in line and ('PBXBuildFile' in line or 'Sources' in line):
-        print(f"Removing line: {line.strip()}")
-        continue
-    filtered_lines.append(line)
+# Lines that reference subscription.proto in build sources
+PROTO_REF = re.compile(rb'subscription\.proto')
+BUILD_CONTEXT = re.compile(rb'PBXBuildFile|Sources')
 
-content = '\n'.join(filtered_lines)
+def references_proto(path):
+    # Search the raw bytes through a memory map; no decode, and the OS only
+    # pages in what the search touches
+    if not os.path.getsize(path):
+        return False
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm.find(b'subscription.proto') != -1
 
-# Write back
-with open('class-notes-frontend.xcodeproj/project.pbxproj', 'w') as f:
-    f.write(content)
+def fix_project(path):
+    if not references_proto(path):
+        print('Nothing to fix')
+        return
 
-print('Fixed project configuration - removed proto file from build sources') 
\ No newline at end of file
+    # Stream the project file line by line into a temp file, then swap it in.
+    # Binary mode: the patterns are ASCII, so no decode/encode is needed.
+    # Resolve symlinks so the link's target is replaced, not the link itself
+    path = os.path.realpath(path)
+    tmp_path = path + '.tmp'
+    removed = 0
+    try:
+        with open(path, 'rb') as fin, open(tmp_path, 'wb') as fout:
+            for line in fin:
+                # Skip lines that reference subscription.proto in build sources
+                if PROTO_REF.search(line) and BUILD_CONTEXT.search(line):
+                    print(f"Removing line: {line.strip().decode('utf-8', 'replace')}")
+                    removed += 1
+                    continue
+                fout.write(line)
+
+        # Leave the project untouched when there is nothing to remove
+        if not removed:
+            print('Nothing to fix')
+            return
+
+        # Keep the original file's permissions on the replacement
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    print('Fixed project configuration - removed proto file from build sources')
+
+if __name__ == '__main__':
+    fix_project(PROJECT_PATH)